@@ -1,27 +1,84 @@
-from fastapi import FastAPI, Depends, Query
-from sqlalchemy.orm import Session
+import os
+import uuid
+import asyncio
+import logging
+import orjson
+from contextlib import asynccontextmanager
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import (
+    FastAPI,
+    Depends,
+    Query,
+    BackgroundTasks,
+    HTTPException,
+    Request,
+)
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List
+from datetime import datetime
 from db.schema import (
     LineSchema,
     TotalDataUsedPerLine,
     RenewalCostCount,
     RemainingBalanceByLine,
+    SpeedStatsPerLine,
+    DailySpeedStatsPerLine,
     AverageSpeedsPerLine,
     AveragePingPerLine,
+    ChartTask,
 )
 from db.crud import (
+    DEFAULT_MIN_RENEWAL_COUNT,
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    MAX_WINDOW_DAYS,
     read_lines,
     read_quota_results,
     read_speed_test_results,
     get_total_dataused_per_line,
     get_count_per_renewal_cost,
     remaining_balance_by_line,
+    speed_stats_per_line,
+    daily_speed_stats_per_line,
     average_speeds_per_line,
     average_ping_per_line,
 )
-from db.database import get_db
+from db.database import AsyncSessionLocal, get_db
+import charts
+
+logger = logging.getLogger(__name__)
+
+# Seconds an aggregate query may run before the request is failed with a 504
+AGGREGATE_TIMEOUT = float(os.getenv("AGGREGATE_TIMEOUT", 2.0))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Runs the chart worker pool for the lifetime of the application.
+    """
+    app.state.chart_executor = charts.create_executor()
+    try:
+        yield
+    finally:
+        app.state.chart_executor.shutdown()
+
+
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
+
 
-app = FastAPI()
+async def with_timeout(aggregate):
+    """
+    Awaits an aggregate query, cancelling it after ``AGGREGATE_TIMEOUT`` seconds so
+    a slow database can't pin the worker indefinitely.
+    """
+    try:
+        return await asyncio.wait_for(aggregate, timeout=AGGREGATE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Aggregate query timed out")
 
 
 @app.get("/")
@@ -32,77 +89,283 @@ async def root():
     return {"message": "Hello World"}
 
 
+@app.get("/healthz")
+async def healthz(db: AsyncSession = Depends(get_db)):
+    """
+    Readiness probe checking that a database connection can run a query.
+    """
+    try:
+        await with_timeout(db.execute(select(1)))
+    except (HTTPException, SQLAlchemyError, OSError) as e:
+        logger.warning("Health check failed: %s", e)
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    return {"status": "ok"}
+
+
 @app.get("/lines", response_model=List[LineSchema])
-async def get_lines(id: Optional[int] = None, db: Session = Depends(get_db)):
+async def get_lines(id: Optional[int] = None, db: AsyncSession = Depends(get_db)):
     """
     Fetches all lines or a specific line by ID.
     """
-    return read_lines(db, id)
+    return await read_lines(db, id)
+
+
+def stream_ndjson(read, **params) -> StreamingResponse:
+    """
+    Streams the records yielded by a CRUD reader as newline-delimited JSON.
+
+    The session is opened inside the generator rather than through ``get_db`` so
+    that it stays open until the last row has been sent.
+    """
+
+    async def generate():
+        async with AsyncSessionLocal() as db:
+            async for record in read(db, **params):
+                yield orjson.dumps(record.model_dump()) + b"\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
 
 
 @app.get("/quota-results")
 async def get_quota_results(
-    line_id: Optional[int] = None, db: Session = Depends(get_db)
+    line_id: Optional[int] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    before: Optional[datetime] = Query(
+        None, description="date_time of the last result seen (keyset cursor)"
+    ),
+    before_id: Optional[int] = Query(
+        None, description="id of the last result seen, breaking date_time ties"
+    ),
 ):
     """
-    Fetches quota results for a specific line.
+    Streams a page of quota results for a specific line, newest first.
     """
-    return read_quota_results(db, line_id)
+    return stream_ndjson(
+        read_quota_results,
+        line_id=line_id,
+        limit=limit,
+        offset=offset,
+        before=before,
+        before_id=before_id,
+    )
 
 
 @app.get("/speed-test-results")
 async def get_speed_test_results(
-    line_id: Optional[int] = None, db: Session = Depends(get_db)
+    line_id: Optional[int] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
 ):
     """
-    Fetches speed test results for a specific line.
+    Streams a page of speed test results for a specific line.
     """
-    return read_speed_test_results(db, line_id)
+    return stream_ndjson(
+        read_speed_test_results, line_id=line_id, limit=limit, offset=offset
+    )
 
 
 @app.get("/total-dataused-per-line", response_model=List[TotalDataUsedPerLine])
-async def get_total_dataused_per_line(db: Session = Depends(get_db)):
+async def total_dataused_per_line(db: AsyncSession = Depends(get_db)):
     """
     Fetches total data usage for all lines.
     """
-    return get_total_dataused_per_line(db)
+    return await with_timeout(get_total_dataused_per_line(db))
 
 
 @app.get("/count-per-renewal-cost", response_model=List[RenewalCostCount])
-async def get_count_per_renewal_cost(db: Session = Depends(get_db)):
+async def count_per_renewal_cost(
+    min_count: int = Query(
+        DEFAULT_MIN_RENEWAL_COUNT,
+        ge=1,
+        description="Minimum occurrences before a cost is grouped as Other",
+    ),
+    db: AsyncSession = Depends(get_db),
+):
     """
     Fetches the count of occurrences for each renewal cost.
     """
-    return get_count_per_renewal_cost(db)
+    return await with_timeout(get_count_per_renewal_cost(db, min_count=min_count))
 
 
 @app.get("/remaining-balance-by-line", response_model=List[RemainingBalanceByLine])
-async def get_remaining_balance_by_line(db: Session = Depends(get_db)):
+async def get_remaining_balance_by_line(db: AsyncSession = Depends(get_db)):
     """
     Fetches the remaining balance for all lines.
     """
-    return remaining_balance_by_line(db)
+    return await with_timeout(remaining_balance_by_line(db))
+
+
+@app.get("/speed-stats-per-line", response_model=List[SpeedStatsPerLine])
+async def get_speed_stats_per_line(
+    days: int = Query(
+        ...,
+        ge=1,
+        le=MAX_WINDOW_DAYS,
+        description="Number of days to calculate averages over",
+    ),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Fetches the average ping, upload and download speeds for each line over a specified number of days.
+    """
+    return await with_timeout(speed_stats_per_line(db, days=days))
+
+
+@app.get("/daily-speed-stats-per-line", response_model=List[DailySpeedStatsPerLine])
+async def get_daily_speed_stats_per_line(
+    days: int = Query(
+        ...,
+        ge=1,
+        le=MAX_WINDOW_DAYS,
+        description="Number of days to calculate averages over",
+    ),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Fetches the daily average ping, upload and download speeds for each line over a specified number of days.
+    """
+    return await with_timeout(daily_speed_stats_per_line(db, days=days))
 
 
 @app.get("/average-speeds-per-line", response_model=List[AverageSpeedsPerLine])
 async def get_average_speeds_per_line(
     days: int = Query(
-        ..., description="Number of days to calculate average speeds over"
+        ...,
+        ge=1,
+        le=MAX_WINDOW_DAYS,
+        description="Number of days to calculate average speeds over",
     ),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     """
     Fetches the average upload and download speeds for each line over a specified number of days.
     """
-    return average_speeds_per_line(db, days=days)
+    return await with_timeout(average_speeds_per_line(db, days=days))
 
 
 @app.get("/average-ping-per-line", response_model=List[AveragePingPerLine])
 async def get_average_ping_per_line(
-    days: int = Query(..., description="Number of days to calculate average ping over"),
-    db: Session = Depends(get_db),
+    days: int = Query(
+        ...,
+        ge=1,
+        le=MAX_WINDOW_DAYS,
+        description="Number of days to calculate average ping over",
+    ),
+    db: AsyncSession = Depends(get_db),
 ):
     """
     Fetches the average ping for each line over a specified number of days.
     """
-    return average_ping_per_line(db, days=days)
+    return await with_timeout(average_ping_per_line(db, days=days))
+
+
+async def build_total_dataused_chart(
+    db: AsyncSession, executor: ProcessPoolExecutor
+) -> bytes:
+    """
+    Renders the total data used per line as a PNG bar chart.
+    """
+    results = await get_total_dataused_per_line(db)
+    return await charts.render(
+        executor,
+        charts.render_total_dataused_chart,
+        [result.line_id for result in results],
+        [result.total_dataused for result in results],
+    )
+
+
+async def build_renewal_cost_chart(
+    db: AsyncSession, executor: ProcessPoolExecutor, min_count: int
+) -> bytes:
+    """
+    Renders the count per renewal cost as a PNG pie chart.
+    """
+    results = await get_count_per_renewal_cost(db, min_count=min_count)
+    return await charts.render(
+        executor,
+        charts.render_renewal_cost_chart,
+        [result.label for result in results],
+        [result.count for result in results],
+    )
+
+
+async def run_chart_task(
+    task_id: str, build, executor: ProcessPoolExecutor, **params
+):
+    """
+    Background task rendering a chart and storing the PNG under its task ID.
+    """
+    try:
+        async with AsyncSessionLocal() as db:
+            png = await build(db, executor, **params)
+    except Exception:
+        logger.exception("Failed to render chart %s.", task_id)
+        await charts.save_chart(task_id, charts.FAILED)
+    else:
+        await charts.save_chart(task_id, charts.DONE, png)
+
+
+async def start_chart_task(
+    request: Request, background_tasks: BackgroundTasks, build, **params
+):
+    """
+    Registers a pending chart and schedules its rendering after the response, in
+    the application's chart worker pool.
+    """
+    task_id = uuid.uuid4().hex
+    await charts.save_chart(task_id, charts.PENDING)
+    background_tasks.add_task(
+        run_chart_task, task_id, build, request.app.state.chart_executor, **params
+    )
+    return ChartTask(task_id=task_id, status=charts.PENDING)
+
+
+@app.post(
+    "/charts/total-dataused-per-line", response_model=ChartTask, status_code=202
+)
+async def create_total_dataused_chart(
+    request: Request, background_tasks: BackgroundTasks
+):
+    """
+    Starts rendering the total data used per line chart in the background.
+    """
+    return await start_chart_task(
+        request, background_tasks, build_total_dataused_chart
+    )
+
+
+@app.post("/charts/count-per-renewal-cost", response_model=ChartTask, status_code=202)
+async def create_renewal_cost_chart(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    min_count: int = Query(
+        DEFAULT_MIN_RENEWAL_COUNT,
+        ge=1,
+        description="Minimum occurrences before a cost is grouped as Other",
+    ),
+):
+    """
+    Starts rendering the count per renewal cost chart in the background.
+    """
+    return await start_chart_task(
+        request, background_tasks, build_renewal_cost_chart, min_count=min_count
+    )
+
+
+@app.get("/charts/{task_id}")
+async def get_chart(task_id: str):
+    """
+    Returns the rendered chart as a PNG, or the task status while it is pending.
+    A chart whose rendering failed is reported as a 500.
+    """
+    stored = await charts.load_chart(task_id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Chart not found")
+
+    status, png = stored
+    if status == charts.DONE:
+        return Response(content=png, media_type="image/png")
+    if status == charts.FAILED:
+        raise HTTPException(status_code=500, detail="Chart rendering failed")
+    return ChartTask(task_id=task_id, status=status)
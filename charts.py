@@ -0,0 +1,169 @@
+import os
+import time
+import asyncio
+import multiprocessing
+import logging
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib
+
+# Render off-screen; there is no display on the API workers
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt  # noqa: E402
+from redis.exceptions import RedisError  # noqa: E402
+from db import cache  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+# Rendered charts (and their status) expire after this many seconds
+CHART_TTL = 3600
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+# Fallback store used when Redis isn't configured; only visible to this process.
+# Entries are (expiry, status, png), expiry being a time.monotonic() deadline
+_charts: Dict[str, Tuple[float, str, Optional[bytes]]] = {}
+
+# Processes rendering charts in each API worker
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", 1))
+
+
+def render_total_dataused_chart(
+    line_ids: List[Optional[int]], total_dataused: List[Optional[float]]
+) -> bytes:
+    """
+    Renders total data used per line as a PNG bar chart.
+
+    Results without a line are drawn under "None", and missing totals as zero.
+
+    Args:
+        line_ids (List[Optional[int]]): Line IDs for the x-axis.
+        total_dataused (List[Optional[float]]): Total data used by each line.
+
+    Returns:
+        bytes: The PNG image.
+    """
+    fig = plt.figure(figsize=(10, 6))
+    plt.bar(
+        [str(line_id) for line_id in line_ids],
+        [total or 0 for total in total_dataused],
+        color="skyblue",
+    )
+    plt.xlabel("Line ID")
+    plt.ylabel("Total Data Used")
+    plt.title("Total Data Used per Line ID")
+    plt.grid(axis="y", linestyle="--", alpha=0.7)
+    return _to_png(fig)
+
+
+def render_renewal_cost_chart(labels: List[str], counts: List[int]) -> bytes:
+    """
+    Renders the distribution of counts by renewal cost as a PNG pie chart.
+
+    Args:
+        labels (List[str]): Label of each renewal cost slice.
+        counts (List[int]): Number of occurrences of each renewal cost.
+
+    Returns:
+        bytes: The PNG image.
+    """
+    fig = plt.figure(figsize=(8, 8))
+    plt.pie(
+        counts,
+        labels=labels,
+        autopct="%1.1f%%",
+        colors=plt.cm.Paired(range(len(counts))),
+    )
+    plt.title("Distribution of Counts by Renewal Cost")
+    return _to_png(fig)
+
+
+def _to_png(fig) -> bytes:
+    buffer = BytesIO()
+    fig.savefig(buffer, format="png")
+    plt.close(fig)
+    return buffer.getvalue()
+
+
+def create_executor() -> ProcessPoolExecutor:
+    """
+    Creates the pool of ``CHART_WORKERS`` processes charts are rendered in.
+
+    Workers are spawned rather than forked: by the time the pool starts the API
+    process runs threads, and a forked child can deadlock on a lock one of them
+    held.
+    """
+    return ProcessPoolExecutor(
+        max_workers=CHART_WORKERS, mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+async def render(executor: ProcessPoolExecutor, func, *args) -> bytes:
+    """
+    Runs a chart renderer in a worker process so rasterization never blocks the
+    event loop.
+    """
+    return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+
+async def save_chart(task_id: str, status: str, png: Optional[bytes] = None):
+    """
+    Stores the status (and, once rendered, the PNG) of a chart task.
+
+    Args:
+        task_id (str): The chart task ID.
+        status (str): One of ``PENDING``, ``DONE`` or ``FAILED``.
+        png (bytes, optional): The rendered chart. Defaults to None.
+    """
+    if cache.redis_client is None:
+        _store_locally(task_id, status, png)
+        return
+    try:
+        # The PNG is written before the status so a DONE status is never
+        # visible without its image
+        if png is not None:
+            await cache.redis_client.setex(f"chart:{task_id}:png", CHART_TTL, png)
+        await cache.redis_client.setex(f"chart:{task_id}:status", CHART_TTL, status)
+    except RedisError as e:
+        logger.warning("Failed to store chart %s: %s", task_id, e)
+        _store_locally(task_id, status, png)
+
+
+def _store_locally(task_id: str, status: str, png: Optional[bytes]):
+    now = time.monotonic()
+    for expired in [key for key, entry in _charts.items() if entry[0] < now]:
+        del _charts[expired]
+    _charts[task_id] = (now + CHART_TTL, status, png)
+
+
+async def load_chart(task_id: str) -> Optional[Tuple[str, Optional[bytes]]]:
+    """
+    Fetches the status and PNG of a chart task.
+
+    Args:
+        task_id (str): The chart task ID.
+
+    Returns:
+        Optional[Tuple[str, Optional[bytes]]]: The status and PNG, or None if the
+        task is unknown or has expired.
+    """
+    if cache.redis_client is not None:
+        try:
+            status, png = await cache.redis_client.mget(
+                f"chart:{task_id}:status", f"chart:{task_id}:png"
+            )
+        except RedisError as e:
+            logger.warning("Failed to load chart %s: %s", task_id, e)
+        else:
+            if status is not None:
+                status = status.decode()
+                if status == DONE and png is None:
+                    return None
+                return status, png
+    entry = _charts.get(task_id)
+    if entry is None or entry[0] < time.monotonic():
+        return None
+    return entry[1], entry[2]
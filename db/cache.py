@@ -0,0 +1,63 @@
+import os
+import logging
+import functools
+from pydantic import TypeAdapter
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Caching is disabled unless a Redis URL is configured
+REDIS_URL = os.getenv("REDIS_URL")
+
+redis_client = Redis.from_url(REDIS_URL) if REDIS_URL else None
+
+
+def cached(name: str, ttl: int, adapter: TypeAdapter):
+    """
+    Cache-aside decorator for aggregation CRUD functions.
+
+    The result is stored in Redis under ``agg:<name>:<args...>`` where the
+    arguments are every parameter after the session, serialized as JSON through
+    ``adapter``. Redis failures are logged and fall through to the database.
+
+    Args:
+        name (str): Cache key prefix identifying the aggregation.
+        ttl (int): Time to live of the cached result, in seconds.
+        adapter (TypeAdapter): Adapter for the function's return type.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(session, *args, **kwargs):
+            if redis_client is None:
+                return await func(session, *args, **kwargs)
+
+            key = ":".join(
+                ["agg", name, *map(str, args)]
+                + [str(kwargs[k]) for k in sorted(kwargs)]
+            )
+            try:
+                cached_results = await redis_client.get(key)
+            except RedisError as e:
+                logger.warning("Redis unavailable, skipping cache for %s: %s", key, e)
+                return await func(session, *args, **kwargs)
+
+            if cached_results is not None:
+                logger.info("Cache hit for %s.", key)
+                return adapter.validate_json(cached_results)
+
+            results = await func(session, *args, **kwargs)
+            try:
+                await redis_client.setex(key, ttl, adapter.dump_json(results))
+            except RedisError as e:
+                logger.warning("Failed to cache results for %s: %s", key, e)
+            return results
+
+        return wrapper
+
+    return decorator
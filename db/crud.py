@@ -1,219 +1,465 @@
 import logging
-from sqlalchemy import select, func, desc
-from sqlalchemy.orm import Session
+from sqlalchemy import String, select, func, desc, case, cast, bindparam, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.cache import cached
 from db.model import Line, QuotaResults, SpeedTestResult
 from db.schema import (
     LineSchema,
     QuotaResultSchema,
     SpeedTestResultSchema,
+    TotalDataUsedPerLine,
+    RenewalCostCount,
+    RemainingBalanceByLine,
+    SpeedStatsPerLine,
+    DailySpeedStatsPerLine,
     AverageSpeedsPerLine,
     AveragePingPerLine,
 )
-from typing import List
-from datetime import datetime, timedelta
-import matplotlib.pyplot as plt
+from typing import AsyncIterator, List, Tuple
+from pydantic import TypeAdapter
+from datetime import datetime, time, timedelta
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
+# Number of rows fetched per round trip when streaming large result sets
+STREAM_BATCH_SIZE = 1000
+
+# Page size bounds for the raw result listings
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Renewal costs seen fewer times than this are grouped as "Other" by default
+DEFAULT_MIN_RENEWAL_COUNT = 5
+
+# Longest window, in days, the speed aggregates may be requested over
+MAX_WINDOW_DAYS = 365
+
+# Time windows are snapped to buckets of this many minutes
+WINDOW_BUCKET_MINUTES = 5
+
+# Adapters validate whole result batches at once instead of one model per row
+_TOTAL_DATAUSED_TA = TypeAdapter(List[TotalDataUsedPerLine])
+_RENEWAL_COST_COUNT_TA = TypeAdapter(List[RenewalCostCount])
+_REMAINING_BALANCE_TA = TypeAdapter(List[RemainingBalanceByLine])
+_SPEED_STATS_TA = TypeAdapter(List[SpeedStatsPerLine])
+_DAILY_SPEED_STATS_TA = TypeAdapter(List[DailySpeedStatsPerLine])
+
+# Base statements are built once at import; per-call filters are added on top and
+# values travel as bound parameters, so each shape hits the compiled cache
+# Raw listings select plain columns rather than ORM entities: rows come back as
+# mappings and skip identity-map bookkeeping entirely. The schemas mirror the
+# models' column types and nullability (every non-key column may be NULL), so
+# records are built with model_construct (no validation)
+_LINES_STMT = select(*Line.__table__.columns)
+_QUOTA_RESULTS_STMT = select(*QuotaResults.__table__.columns).order_by(
+    desc(QuotaResults.date_time), desc(QuotaResults.id)
+)
+_SPEED_TEST_RESULTS_STMT = select(*SpeedTestResult.__table__.columns).order_by(
+    SpeedTestResult.id
+)
+
+_TOTAL_DATAUSED_STMT = select(
+    QuotaResults.line_id,
+    func.sum(QuotaResults.data_used).label("total_dataused"),
+).group_by(QuotaResults.line_id)
+
+_RENEWAL_COUNTS = (
+    select(QuotaResults.renewal_cost, func.count().label("count"))
+    .filter(QuotaResults.renewal_cost.isnot(None))
+    .group_by(QuotaResults.renewal_cost)
+    .subquery()
+)
+_RENEWAL_COST_IS_FREQUENT = _RENEWAL_COUNTS.c.count >= bindparam("min_count")
+_RENEWAL_COST_BUCKET = case(
+    (_RENEWAL_COST_IS_FREQUENT, _RENEWAL_COUNTS.c.renewal_cost),
+    else_=None,
+).label("renewal_cost")
+# Chart-ready label for each bucket, formatted by the database
+_RENEWAL_COST_LABEL = case(
+    (_RENEWAL_COST_IS_FREQUENT, cast(_RENEWAL_COUNTS.c.renewal_cost, String)),
+    else_="Other",
+).label("label")
+_RENEWAL_COST_COUNT_STMT = (
+    select(
+        _RENEWAL_COST_BUCKET,
+        _RENEWAL_COST_LABEL,
+        func.sum(_RENEWAL_COUNTS.c.count).label("count"),
+    )
+    .group_by(_RENEWAL_COST_BUCKET, _RENEWAL_COST_LABEL)
+    .order_by(desc("count"))
+)
+
+_REMAINING_BALANCE_STMT = select(
+    QuotaResults.line_id,
+    func.sum(QuotaResults.balance).label("total_balance"),
+).group_by(QuotaResults.line_id)
+
+_SPEED_STATS_STMT = (
+    select(
+        SpeedTestResult.line_id,
+        func.avg(SpeedTestResult.ping).label("avg_ping"),
+        func.avg(SpeedTestResult.upload_speed).label("avg_upload_speed"),
+        func.avg(SpeedTestResult.download_speed).label("avg_download_speed"),
+    )
+    .filter(
+        SpeedTestResult.date_time.between(
+            bindparam("start_date"), bindparam("end_date")
+        )
+    )
+    .group_by(SpeedTestResult.line_id)
+)
+
+# Grouping on DATE(date_time) matches the ix_speed_line_day expression index
+_SPEED_TEST_DAY = func.date(SpeedTestResult.date_time).label("day")
+_DAILY_SPEED_STATS_STMT = (
+    select(
+        SpeedTestResult.line_id,
+        _SPEED_TEST_DAY,
+        func.avg(SpeedTestResult.ping).label("avg_ping"),
+        func.avg(SpeedTestResult.upload_speed).label("avg_upload_speed"),
+        func.avg(SpeedTestResult.download_speed).label("avg_download_speed"),
+    )
+    .filter(
+        SpeedTestResult.date_time.between(
+            bindparam("start_date"), bindparam("end_date")
+        )
+    )
+    .group_by(SpeedTestResult.line_id, _SPEED_TEST_DAY)
+    .order_by(SpeedTestResult.line_id, _SPEED_TEST_DAY)
+)
+
 
-def read_lines(session: Session, id: int = None):
+async def read_lines(session: AsyncSession, id: int = None):
     """
     Fetches lines from the database. Optionally filters by line ID.
 
     Args:
-        session (Session): SQLAlchemy session for database interaction.
+        session (AsyncSession): SQLAlchemy async session for database interaction.
         id (int, optional): The ID of the line to filter by. Defaults to None.
 
     Returns:
-        List[LineSchema]: List of validated line records.
+        List[LineSchema]: List of line records.
     """
-    stmt = select(Line)
+    stmt = _LINES_STMT
 
     if id:
         stmt = stmt.where(Line.id == id)
 
-    results = session.execute(stmt).scalars().all()
-    logger.info(f"Fetched {len(results)} lines from the database.")
-    return [LineSchema.model_validate(line) for line in results]
+    results = (await session.execute(stmt)).mappings().all()
+    logger.info("Fetched %d lines from the database.", len(results))
+    return [LineSchema.model_construct(**line) for line in results]
 
 
-def read_quota_results(session: Session, line_id: int = None):
+async def read_quota_results(
+    session: AsyncSession,
+    line_id: int = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    offset: int = 0,
+    before: datetime = None,
+    before_id: int = None,
+) -> AsyncIterator[QuotaResultSchema]:
     """
-    Fetches quota results from the database. Optionally filters by line ID.
+    Streams a page of quota results from the database, newest first. Optionally
+    filters by line ID.
+
+    Rows are fetched from a server-side cursor in batches of ``STREAM_BATCH_SIZE``
+    so the full result set is never held in memory. For deep pages, pass the
+    ``date_time`` and ``id`` of the last record seen as ``before`` and
+    ``before_id`` instead of a large ``offset``, so the database can seek straight
+    to the next page. Ties on ``date_time`` are ordered by ``id``, so records
+    sharing the last record's timestamp are not skipped.
 
     Args:
-        session (Session): SQLAlchemy session for database interaction.
+        session (AsyncSession): SQLAlchemy async session for database interaction.
         line_id (int, optional): The ID of the line to filter by. Defaults to None.
-
-    Returns:
-        List[QuotaResultSchema]: List of validated quota result records.
+        limit (int, optional): Maximum number of records to return. Defaults to 100.
+        offset (int, optional): Number of records to skip. Defaults to 0.
+        before (datetime, optional): ``date_time`` of the cursor record. Without
+            ``before_id``, only records strictly older than it are returned.
+            Defaults to None.
+        before_id (int, optional): ``id`` of the cursor record, breaking ties on
+            ``before``. Defaults to None.
+
+    Yields:
+        QuotaResultSchema: Quota result records.
     """
-    stmt = select(QuotaResults)
+    stmt = _QUOTA_RESULTS_STMT
     if line_id:
         stmt = stmt.where(QuotaResults.line_id == line_id)
-    stmt = stmt.order_by(desc(QuotaResults.date_time))
-
-    results = session.execute(stmt).scalars().all()
-    logger.info(f"Fetched {len(results)} quota results from the database.")
-    return [QuotaResultSchema.model_validate(result) for result in results]
-
+    if before and before_id is not None:
+        stmt = stmt.where(
+            or_(
+                QuotaResults.date_time < before,
+                and_(QuotaResults.date_time == before, QuotaResults.id < before_id),
+            )
+        )
+    elif before:
+        stmt = stmt.where(QuotaResults.date_time < before)
+    stmt = stmt.limit(limit).offset(offset)
 
-def read_speed_test_results(session: Session, line_id: int = None):
+    results = await session.stream(
+        stmt.execution_options(yield_per=STREAM_BATCH_SIZE)
+    )
+    count = 0
+    async for partition in results.mappings().partitions():
+        count += len(partition)
+        for result in partition:
+            yield QuotaResultSchema.model_construct(**result)
+    logger.info("Streamed %d quota results from the database.", count)
+
+
+async def read_speed_test_results(
+    session: AsyncSession,
+    line_id: int = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    offset: int = 0,
+) -> AsyncIterator[SpeedTestResultSchema]:
     """
-    Fetches speed test results from the database. Optionally filters by line ID.
+    Streams a page of speed test results from the database. Optionally filters by
+    line ID.
+
+    Rows are fetched from a server-side cursor in batches of ``STREAM_BATCH_SIZE``
+    so the full result set is never held in memory.
 
     Args:
-        session (Session): SQLAlchemy session for database interaction.
+        session (AsyncSession): SQLAlchemy async session for database interaction.
         line_id (int, optional): The ID of the line to filter by. Defaults to None.
+        limit (int, optional): Maximum number of records to return. Defaults to 100.
+        offset (int, optional): Number of records to skip. Defaults to 0.
 
-    Returns:
-        List[SpeedTestResultSchema]: List of validated speed test result records.
+    Yields:
+        SpeedTestResultSchema: Speed test result records.
     """
-    stmt = select(SpeedTestResult)
+    stmt = _SPEED_TEST_RESULTS_STMT
     if line_id:
         stmt = stmt.where(SpeedTestResult.line_id == line_id)
+    stmt = stmt.limit(limit).offset(offset)
+
+    results = await session.stream(
+        stmt.execution_options(yield_per=STREAM_BATCH_SIZE)
+    )
+    count = 0
+    async for partition in results.mappings().partitions():
+        count += len(partition)
+        for result in partition:
+            yield SpeedTestResultSchema.model_construct(**result)
+    logger.info("Streamed %d speed test results from the database.", count)
+
+
+@cached("total_dataused", ttl=300, adapter=_TOTAL_DATAUSED_TA)
+async def get_total_dataused_per_line(
+    session: AsyncSession,
+) -> List[TotalDataUsedPerLine]:
+    """
+    Fetches total data used per line.
 
-    results = session.execute(stmt).scalars().all()
-    logger.info(f"Fetched {len(results)} speed test results from the database.")
-    return [SpeedTestResultSchema.model_validate(result) for result in results]
+    Args:
+        session (AsyncSession): SQLAlchemy async session for database interaction.
 
+    Returns:
+        List[TotalDataUsedPerLine]: List of total data used per line.
+    """
+    results = (await session.execute(_TOTAL_DATAUSED_STMT)).mappings().all()
+    logger.info("Fetched total data usage for %d lines.", len(results))
+    return _TOTAL_DATAUSED_TA.validate_python(results)
 
-def get_total_dataused_per_line(session: Session):
+
+@cached("renewal_cost_count", ttl=60, adapter=_RENEWAL_COST_COUNT_TA)
+async def get_count_per_renewal_cost(
+    session: AsyncSession, min_count: int = DEFAULT_MIN_RENEWAL_COUNT
+) -> List[RenewalCostCount]:
     """
-    Fetches total data used per line and displays it as a bar chart.
+    Fetches the count of occurrences for each renewal cost.
+
+    Renewal costs occurring fewer than ``min_count`` times are folded into a
+    single "Other" bucket (``renewal_cost`` of None) in SQL, so the number of
+    returned rows stays bounded regardless of how many distinct costs exist.
+    Each row also carries a ready-to-display ``label`` built by the database.
 
     Args:
-        session (Session): SQLAlchemy session for database interaction.
+        session (AsyncSession): SQLAlchemy async session for database interaction.
+        min_count (int, optional): Minimum occurrences for a renewal cost to be
+            reported on its own. Defaults to ``DEFAULT_MIN_RENEWAL_COUNT``.
+
+    Returns:
+        List[RenewalCostCount]: List of occurrence counts per renewal cost.
     """
-    stmt = select(
-        QuotaResults.line_id,
-        func.sum(QuotaResults.data_used).label("total_dataused"),
-    ).group_by(QuotaResults.line_id)
+    results = (
+        await session.execute(_RENEWAL_COST_COUNT_STMT, {"min_count": min_count})
+    ).mappings().all()
+    logger.info(
+        "Fetched renewal cost counts for %d renewal cost categories.", len(results)
+    )
+    return _RENEWAL_COST_COUNT_TA.validate_python(results)
 
-    results = session.execute(stmt).fetchall()
-    logger.info(f"Fetched total data usage for {len(results)} lines.")
 
-    line_ids = [result.line_id for result in results]
-    total_dataused = [result.total_dataused for result in results]
+@cached("remaining_balance", ttl=300, adapter=_REMAINING_BALANCE_TA)
+async def remaining_balance_by_line(
+    session: AsyncSession,
+) -> List[RemainingBalanceByLine]:
+    """
+    Fetches the total remaining balance by line.
 
-    # Plot the data
-    plt.figure(figsize=(10, 6))
-    plt.bar(line_ids, total_dataused, color="skyblue")
-    plt.xlabel("Line ID")
-    plt.ylabel("Total Data Used")
-    plt.title("Total Data Used per Line ID")
-    plt.xticks(line_ids)
-    plt.grid(axis="y", linestyle="--", alpha=0.7)
-    plt.show()
-    logger.info("Displayed total data used per line chart.")
+    Args:
+        session (AsyncSession): SQLAlchemy async session for database interaction.
 
+    Returns:
+        List[RemainingBalanceByLine]: List of total remaining balances per line.
+    """
+    results = (await session.execute(_REMAINING_BALANCE_STMT)).mappings().all()
+    logger.info("Fetched remaining balances for %d lines.", len(results))
+    return _REMAINING_BALANCE_TA.validate_python(results)
 
-def get_count_per_renewal_cost(session: Session):
+
+def speed_stats_window(days: int) -> Tuple[datetime, datetime]:
     """
-    Fetches the count of occurrences for each renewal cost and displays it as a pie chart.
+    Computes the ``[start, end]`` window for the speed aggregates.
+
+    The end is snapped down to a ``WINDOW_BUCKET_MINUTES`` boundary so that every
+    request for the same ``days`` within a bucket produces identical parameters,
+    and therefore the same cache key.
 
     Args:
-        session (Session): SQLAlchemy session for database interaction.
+        days (int): The number of days in the past to consider.
+
+    Returns:
+        Tuple[datetime, datetime]: The start and end of the window.
     """
-    stmt = (
-        session.query(QuotaResults.renewal_cost, func.count().label("count"))
-        .filter(QuotaResults.renewal_cost.isnot(None))
-        .group_by(QuotaResults.renewal_cost)
-        .all()
+    now = datetime.now()
+    end_date = now.replace(
+        minute=now.minute - now.minute % WINDOW_BUCKET_MINUTES,
+        second=0,
+        microsecond=0,
     )
-    logger.info(f"Fetched renewal cost counts for {len(stmt)} renewal cost categories.")
-
-    renewal_costs = [float(row.renewal_cost) for row in stmt]
-    counts = [row.count for row in stmt]
-
-    # Plot the data
-    plt.figure(figsize=(8, 8))
-    plt.pie(
-        counts,
-        labels=[f"{cost:.2f}" for cost in renewal_costs],
-        autopct="%1.1f%%",
-        colors=plt.cm.Paired(range(len(counts))),
-    )
-    plt.title("Distribution of Counts by Renewal Cost")
-    plt.show()
-    logger.info("Displayed pie chart for renewal cost distribution.")
+    return end_date - timedelta(days=days), end_date
 
 
-def remaining_balance_by_line(session: Session):
+async def speed_stats_per_line(
+    session: AsyncSession, days: int
+) -> List[SpeedStatsPerLine]:
     """
-    Fetches and logs the total remaining balance by line.
+    Fetches the average ping, upload and download speeds per line over a specified
+    period in a single aggregation.
 
     Args:
-        session (Session): SQLAlchemy session for database interaction.
+        session (AsyncSession): SQLAlchemy async session for database interaction.
+        days (int): The number of days in the past to consider.
+
+    Returns:
+        List[SpeedStatsPerLine]: List of average ping and speeds per line.
+    """
+    start_date, end_date = speed_stats_window(days)
+    return await _speed_stats_between(session, start_date, end_date)
+
+
+@cached("speed_stats", ttl=WINDOW_BUCKET_MINUTES * 60, adapter=_SPEED_STATS_TA)
+async def _speed_stats_between(
+    session: AsyncSession, start_date: datetime, end_date: datetime
+) -> List[SpeedStatsPerLine]:
+    """
+    Runs the speed stats aggregation for an explicit window, cached per window.
     """
     results = (
-        session.query(
-            QuotaResults.line_id,
-            func.sum(QuotaResults.balance).label("total_balance"),
+        await session.execute(
+            _SPEED_STATS_STMT, {"start_date": start_date, "end_date": end_date}
         )
-        .group_by(QuotaResults.line_id)
-        .all()
+    ).mappings().all()
+    logger.info(
+        "Fetched speed stats for %d lines between %s and %s.",
+        len(results),
+        start_date,
+        end_date,
     )
-    logger.info(f"Fetched remaining balances for {len(results)} lines.")
+    return _SPEED_STATS_TA.validate_python(results)
+
+
+async def daily_speed_stats_per_line(
+    session: AsyncSession, days: int
+) -> List[DailySpeedStatsPerLine]:
+    """
+    Fetches the daily average ping, upload and download speeds per line over a
+    specified period.
+
+    The window starts at midnight so every day but today is averaged in full.
 
-    for result in results:
-        logger.info(
-            f"Line ID: {result.line_id}, Total Remaining Balance: {result.total_balance}"
+    Args:
+        session (AsyncSession): SQLAlchemy async session for database interaction.
+        days (int): The number of days in the past to consider.
+
+    Returns:
+        List[DailySpeedStatsPerLine]: List of average ping and speeds per line and
+        day, ordered by line and day.
+    """
+    start_date, end_date = speed_stats_window(days)
+    start_date = datetime.combine(start_date.date(), time.min)
+    return await _daily_speed_stats_between(session, start_date, end_date)
+
+
+@cached(
+    "daily_speed_stats",
+    ttl=WINDOW_BUCKET_MINUTES * 60,
+    adapter=_DAILY_SPEED_STATS_TA,
+)
+async def _daily_speed_stats_between(
+    session: AsyncSession, start_date: datetime, end_date: datetime
+) -> List[DailySpeedStatsPerLine]:
+    """
+    Runs the daily speed stats aggregation for an explicit window, cached per window.
+    """
+    results = (
+        await session.execute(
+            _DAILY_SPEED_STATS_STMT, {"start_date": start_date, "end_date": end_date}
         )
+    ).mappings().all()
+    logger.info(
+        "Fetched %d daily speed stats between %s and %s.",
+        len(results),
+        start_date,
+        end_date,
+    )
+    return _DAILY_SPEED_STATS_TA.validate_python(results)
 
 
-def average_speeds_per_line(session: Session, days: int) -> List[AverageSpeedsPerLine]:
+async def average_speeds_per_line(
+    session: AsyncSession, days: int
+) -> List[AverageSpeedsPerLine]:
     """
     Fetches the average upload and download speeds per line over a specified period.
 
     Args:
-        session (Session): SQLAlchemy session for database interaction.
+        session (AsyncSession): SQLAlchemy async session for database interaction.
         days (int): The number of days in the past to consider.
 
     Returns:
         List[AverageSpeedsPerLine]: List of average upload and download speeds per line.
     """
-    end_date = datetime.now().date()
-    start_date = end_date - timedelta(days=days)
-
-    stmt = (
-        select(
-            SpeedTestResult.line_id,
-            func.avg(SpeedTestResult.upload_speed).label("avg_upload_speed"),
-            func.avg(SpeedTestResult.download_speed).label("avg_download_speed"),
+    stats = await speed_stats_per_line(session, days)
+    return [
+        AverageSpeedsPerLine(
+            line_id=row.line_id,
+            avg_upload_speed=row.avg_upload_speed,
+            avg_download_speed=row.avg_download_speed,
         )
-        .filter(SpeedTestResult.date_time.between(start_date, end_date))
-        .group_by(SpeedTestResult.line_id)
-    )
-
-    results = session.execute(stmt).fetchall()
-    logger.info(f"Fetched average speeds for {len(results)} lines over {days} days.")
-    return [AverageSpeedsPerLine.model_validate(row) for row in results]
+        for row in stats
+    ]
 
 
-def average_ping_per_line(session: Session, days: int) -> List[AveragePingPerLine]:
+async def average_ping_per_line(
+    session: AsyncSession, days: int
+) -> List[AveragePingPerLine]:
     """
     Fetches the average ping per line over a specified period.
 
     Args:
-        session (Session): SQLAlchemy session for database interaction.
+        session (AsyncSession): SQLAlchemy async session for database interaction.
         days (int): The number of days in the past to consider.
 
     Returns:
         List[AveragePingPerLine]: List of average ping values per line.
     """
-    end_date = datetime.now().date()
-    start_date = end_date - timedelta(days=days)
-
-    stmt = (
-        select(
-            SpeedTestResult.line_id, func.avg(SpeedTestResult.ping).label("avg_ping")
-        )
-        .filter(SpeedTestResult.date_time.between(start_date, end_date))
-        .group_by(SpeedTestResult.line_id)
-    )
-
-    results = session.execute(stmt).all()
-    logger.info(f"Fetched average ping for {len(results)} lines over {days} days.")
-    return [AveragePingPerLine.model_validate(row) for row in results]
+    stats = await speed_stats_per_line(session, days)
+    return [
+        AveragePingPerLine(line_id=row.line_id, avg_ping=row.avg_ping)
+        for row in stats
+    ]
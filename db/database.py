@@ -1,33 +1,87 @@
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+import time
+import asyncio
+import logging
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import (
+    create_async_engine,
+    async_sessionmaker,
+    async_scoped_session,
+)
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Fetch database configuration from environment variables
 DB_USER = os.getenv("DB_USER")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
 DB_HOST = os.getenv("DB_HOST")
 DB_PORT = os.getenv("DB_PORT")
 DB_NAME = os.getenv("DB_NAME")
-DB_DRIVER = os.getenv("DB_DRIVER", "mysql+pymysql")  # Default to mysql+pymysql
+DB_DRIVER = os.getenv("DB_DRIVER", "mysql+asyncmy")  # Default to mysql+asyncmy
 
 # Construct the DATABASE_URL dynamically
 DATABASE_URL = f"{DB_DRIVER}://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
+# The engine is async, so swap the pure-Python sync pymysql driver for asyncmy,
+# whose protocol parsing is compiled
+DATABASE_URL = DATABASE_URL.replace("mysql+pymysql", "mysql+asyncmy")
+
+# Connection pool settings, sized so concurrent requests don't queue on the
+# default pool (size=5, overflow=10)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 20))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 3600))
+
+# Seconds to wait for a new MySQL connection before giving up
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", 2))
+
+# Queries slower than this (in milliseconds) are logged as warnings
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", 100))
+
 # Create engine and session
-engine = create_engine(DATABASE_URL, echo=False)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
+engine = create_async_engine(
+    DATABASE_URL,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_pre_ping=True,
+    pool_recycle=DB_POOL_RECYCLE,
+    connect_args=(
+        {"charset": "utf8mb4", "connect_timeout": DB_CONNECT_TIMEOUT}
+        if DB_DRIVER.startswith("mysql")
+        else {}
+    ),
+    query_cache_size=1200,
+    echo=False,
+)
+AsyncSessionLocal = async_sessionmaker(
+    engine, autoflush=False, expire_on_commit=False
+)
+
+# Process-wide registry handing out one session per asyncio task (i.e. request)
+ScopedSession = async_scoped_session(AsyncSessionLocal, scopefunc=asyncio.current_task)
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _log_slow_query(conn, cursor, statement, parameters, context, executemany):
+    elapsed_ms = (time.perf_counter() - conn.info["query_start_time"].pop()) * 1000
+    if elapsed_ms > SLOW_QUERY_THRESHOLD_MS:
+        logger.warning("Slow query (%.1f ms): %s", elapsed_ms, statement)
 
 
 # Dependency to get a database session
-def get_db():
-    db = SessionLocal()
+async def get_db():
     try:
-        yield db
+        yield ScopedSession()
     finally:
-        db.close()
+        await ScopedSession.remove()
@@ -1,16 +1,20 @@
 # model.py
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
-from sqlalchemy.ext.declarative import declarative_base
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import ForeignKey, Index, func
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
-Base = declarative_base()
+
+class Base(DeclarativeBase):
+    pass
 
 
 class Line(Base):
     __tablename__ = "lines"
 
-    id = Column(Integer, primary_key=True, index=True)
-    line_number = Column(String, unique=True, index=True)
-    name = Column(String, unique=True, index=True)
+    id: Mapped[int] = mapped_column(primary_key=True, index=True)
+    line_number: Mapped[Optional[str]] = mapped_column(unique=True, index=True)
+    name: Mapped[Optional[str]] = mapped_column(unique=True, index=True)
 
     def __repr__(self):
         return f"<Line(id={self.id}, line_number='{self.line_number}', name='{self.name}')>"
@@ -18,18 +22,19 @@ class Line(Base):
 
 class QuotaResults(Base):
     __tablename__ = "quota_results"
+    __table_args__ = (Index("ix_quota_line_date", "line_id", "date_time"),)
 
-    id = Column(Integer, primary_key=True, index=True)
-    process_id = Column(String, unique=True, index=True)
-    line_id = Column(Integer, ForeignKey("lines.id"), index=True)
-    data_used = Column(Integer, index=True)
-    usage_percentage = Column(Integer, index=True)
-    data_remaining = Column(Integer, index=True)
-    balance = Column(Integer, index=True)
-    renewal_date = Column(String, index=True)
-    remaining_days = Column(Integer, index=True)
-    renewal_cost = Column(Integer, index=True)
-    date_time = Column(DateTime, index=True)
+    id: Mapped[int] = mapped_column(primary_key=True, index=True)
+    process_id: Mapped[Optional[str]] = mapped_column(unique=True, index=True)
+    line_id: Mapped[Optional[int]] = mapped_column(ForeignKey("lines.id"))
+    data_used: Mapped[Optional[int]] = mapped_column(index=True)
+    usage_percentage: Mapped[Optional[int]] = mapped_column(index=True)
+    data_remaining: Mapped[Optional[int]] = mapped_column(index=True)
+    balance: Mapped[Optional[int]] = mapped_column(index=True)
+    renewal_date: Mapped[Optional[str]] = mapped_column(index=True)
+    remaining_days: Mapped[Optional[int]] = mapped_column(index=True)
+    renewal_cost: Mapped[Optional[int]] = mapped_column(index=True)
+    date_time: Mapped[Optional[datetime]] = mapped_column(index=True)
 
     def __repr__(self):
         return (
@@ -44,15 +49,16 @@ class QuotaResults(Base):
 
 class SpeedTestResult(Base):
     __tablename__ = "speed_test_results"
+    __table_args__ = (Index("ix_speed_line_date", "line_id", "date_time"),)
 
-    id = Column(Integer, primary_key=True, index=True)
-    process_id = Column(String, unique=True, index=True)
-    line_id = Column(Integer, ForeignKey("lines.id"), index=True)
-    ping = Column(Integer, index=True)
-    upload_speed = Column(Integer, index=True)
-    download_speed = Column(Integer, index=True)
-    public_ip = Column(String, index=True)
-    date_time = Column(DateTime, index=True)
+    id: Mapped[int] = mapped_column(primary_key=True, index=True)
+    process_id: Mapped[Optional[str]] = mapped_column(unique=True, index=True)
+    line_id: Mapped[Optional[int]] = mapped_column(ForeignKey("lines.id"))
+    ping: Mapped[Optional[int]] = mapped_column(index=True)
+    upload_speed: Mapped[Optional[int]] = mapped_column(index=True)
+    download_speed: Mapped[Optional[int]] = mapped_column(index=True)
+    public_ip: Mapped[Optional[str]] = mapped_column(index=True)
+    date_time: Mapped[Optional[datetime]] = mapped_column()
 
     def __repr__(self):
         return (
@@ -61,3 +67,11 @@ class SpeedTestResult(Base):
             f"download_speed={self.download_speed}, public_ip='{self.public_ip}', "
             f"date_time={self.date_time})>"
         )
+
+
+# Expression index so per-day rollups group on an indexed (line_id, day) key
+Index(
+    "ix_speed_line_day",
+    SpeedTestResult.line_id,
+    func.date(SpeedTestResult.date_time),
+)
@@ -1,12 +1,12 @@
 from pydantic import BaseModel, ConfigDict
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional
 
 
 class LineSchema(BaseModel):
     id: int
-    line_number: str
-    name: str
+    line_number: Optional[str] = None
+    name: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -31,31 +31,62 @@ class QuotaResultSchema(BaseModel):
 
 class SpeedTestResultSchema(BaseModel):
     id: int
-    process_id: str
-    line_id: int
-    ping: int
-    upload_speed: int
-    download_speed: int
-    public_ip: str
-    date_time: datetime
+    process_id: Optional[str] = None
+    line_id: Optional[int] = None
+    ping: Optional[int] = None
+    upload_speed: Optional[int] = None
+    download_speed: Optional[int] = None
+    public_ip: Optional[str] = None
+    date_time: Optional[datetime] = None
 
     class Config:
         from_attributes = True
 
 
 class TotalDataUsedPerLine(BaseModel):
-    line_id: int
-    total_dataused: float
+    line_id: Optional[int]
+    total_dataused: Optional[float]
+
+    class Config:
+        from_attributes = True
 
 
 class RenewalCostCount(BaseModel):
-    renewal_cost: float
+    renewal_cost: Optional[float]  # None for the long-tail "Other" bucket
+    label: str
     count: int
 
+    class Config:
+        from_attributes = True
+
 
 class RemainingBalanceByLine(BaseModel):
-    line_id: int
-    total_balance: float
+    line_id: Optional[int]
+    total_balance: Optional[float]
+
+    class Config:
+        from_attributes = True
+
+
+class SpeedStatsPerLine(BaseModel):
+    line_id: Optional[int]
+    avg_ping: Optional[float]
+    avg_upload_speed: Optional[float]
+    avg_download_speed: Optional[float]
+
+    class Config:
+        from_attributes = True
+
+
+class DailySpeedStatsPerLine(BaseModel):
+    line_id: Optional[int]
+    day: date
+    avg_ping: Optional[float]
+    avg_upload_speed: Optional[float]
+    avg_download_speed: Optional[float]
+
+    class Config:
+        from_attributes = True
 
 
 class AverageSpeedsPerLine(BaseModel):
@@ -73,3 +104,8 @@ class AveragePingPerLine(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class ChartTask(BaseModel):
+    task_id: str
+    status: str
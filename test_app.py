@@ -1,55 +1,71 @@
 import pytest
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import pytest_asyncio
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+import charts
+from db import cache
 from db.model import Base, Line, QuotaResults, SpeedTestResult
+from db.schema import SpeedTestResultSchema
 from db.crud import (
+    WINDOW_BUCKET_MINUTES,
     read_lines,
     read_quota_results,
     read_speed_test_results,
     get_total_dataused_per_line,
     get_count_per_renewal_cost,
     remaining_balance_by_line,
+    speed_stats_per_line,
+    speed_stats_window,
+    daily_speed_stats_per_line,
     average_speeds_per_line,
     average_ping_per_line,
 )
 from datetime import datetime, timedelta
 
 # Setup an in-memory SQLite database for testing purposes
-SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+engine = create_async_engine(
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+)
+TestingSessionLocal = async_sessionmaker(
+    engine, autoflush=False, expire_on_commit=False
 )
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
-@pytest.fixture(scope="function")
-def db():
+@pytest_asyncio.fixture(scope="function")
+async def db():
     """
     Setup and teardown fixture for each test function.
     This provides a fresh database and session for each test.
     """
-    Base.metadata.create_all(bind=engine)  # Create the tables
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)  # Create the tables
     db_session = TestingSessionLocal()  # Create a new session
     yield db_session  # Provide the session to the test
-    db_session.close()  # Close the session after test
-    Base.metadata.drop_all(bind=engine)  # Drop all tables
+    await db_session.close()  # Close the session after test
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)  # Drop all tables
 
 
 # Test cases
 
 
-def test_read_lines(db):
+@pytest.mark.asyncio
+async def test_read_lines(db):
     """
     Test reading lines from the database.
     """
     # Arrange: Add a test line to the database
     new_line = Line(id=1, line_number="123", name="Test Line")
     db.add(new_line)
-    db.commit()
+    await db.commit()
 
     # Act: Fetch the lines
-    lines = read_lines(db)
+    lines = await read_lines(db)
 
     # Assert: Check the results
     assert len(lines) == 1
@@ -57,14 +73,15 @@ def test_read_lines(db):
     assert lines[0].name == "Test Line"
 
 
-def test_read_quota_results(db):
+@pytest.mark.asyncio
+async def test_read_quota_results(db):
     """
     Test reading quota results from the database.
     """
     # Arrange: Add a test quota result
     new_line = Line(id=1, line_number="123", name="Test Line")
     db.add(new_line)
-    db.commit()
+    await db.commit()
 
     quota_result = QuotaResults(
         id=1,
@@ -80,10 +97,10 @@ def test_read_quota_results(db):
         date_time=datetime.now(),
     )
     db.add(quota_result)
-    db.commit()
+    await db.commit()
 
     # Act: Fetch the quota results
-    results = read_quota_results(db, line_id=1)
+    results = [result async for result in read_quota_results(db, line_id=1)]
 
     # Assert: Check the results
     assert len(results) == 1
@@ -91,14 +108,67 @@ def test_read_quota_results(db):
     assert results[0].data_used == 100
 
 
-def test_read_speed_test_results(db):
+@pytest.mark.asyncio
+async def test_read_quota_results_pagination(db):
+    """
+    Test paging through quota results with limit/offset and a keyset cursor.
+    """
+    # Arrange: Add three quota results from one scrape and one a day older
+    new_line = Line(id=1, line_number="123", name="Test Line")
+    db.add(new_line)
+    await db.commit()
+
+    now = datetime.now()
+    for id, date_time in [
+        (1, now),
+        (2, now),
+        (3, now),
+        (4, now - timedelta(days=1)),
+    ]:
+        db.add(
+            QuotaResults(
+                id=id,
+                process_id=f"proc-{id}",
+                line_id=1,
+                data_used=100,
+                usage_percentage=50,
+                data_remaining=100,
+                balance=50,
+                renewal_date="2023-09-01",
+                remaining_days=10,
+                renewal_cost=20,
+                date_time=date_time,
+            )
+        )
+    await db.commit()
+
+    # Act: Page through one record at a time with the cursor, and by offset
+    by_cursor = []
+    page = [result async for result in read_quota_results(db, limit=1)]
+    while page:
+        by_cursor.extend(page)
+        page = [
+            result
+            async for result in read_quota_results(
+                db, limit=1, before=page[-1].date_time, before_id=page[-1].id
+            )
+        ]
+    by_offset = [result async for result in read_quota_results(db, limit=2, offset=2)]
+
+    # Assert: Pages are ordered newest first, ties by id, with nothing skipped
+    assert [result.id for result in by_cursor] == [3, 2, 1, 4]
+    assert [result.id for result in by_offset] == [1, 4]
+
+
+@pytest.mark.asyncio
+async def test_read_speed_test_results(db):
     """
     Test reading speed test results from the database.
     """
     # Arrange: Add a test speed test result
     new_line = Line(id=1, line_number="123", name="Test Line")
     db.add(new_line)
-    db.commit()
+    await db.commit()
 
     speed_test = SpeedTestResult(
         id=1,
@@ -111,10 +181,12 @@ def test_read_speed_test_results(db):
         date_time=datetime.now(),
     )
     db.add(speed_test)
-    db.commit()
+    await db.commit()
 
     # Act: Fetch the speed test results
-    results = read_speed_test_results(db, line_id=1)
+    results = [
+        result async for result in read_speed_test_results(db, line_id=1)
+    ]
 
     # Assert: Check the results
     assert len(results) == 1
@@ -122,14 +194,37 @@ def test_read_speed_test_results(db):
     assert results[0].ping == 20
 
 
-def test_get_total_dataused_per_line(db):
+@pytest.mark.asyncio
+async def test_read_speed_test_results_with_nulls(db):
+    """
+    Test that speed test results with NULL columns stream as valid records.
+    """
+    # Arrange: Add a speed test result with only its key columns set
+    new_line = Line(id=1, line_number="123", name="Test Line")
+    db.add(new_line)
+    await db.commit()
+
+    db.add(SpeedTestResult(id=1, line_id=1))
+    await db.commit()
+
+    # Act: Fetch the speed test results
+    results = [result async for result in read_speed_test_results(db, line_id=1)]
+
+    # Assert: The record matches the schema, NULLs included
+    assert len(results) == 1
+    assert results[0].ping is None
+    assert SpeedTestResultSchema.model_validate(results[0].model_dump()) == results[0]
+
+
+@pytest.mark.asyncio
+async def test_get_total_dataused_per_line(db):
     """
     Test fetching the total data used per line.
     """
     # Arrange: Add test data
     new_line = Line(id=1, line_number="123", name="Test Line")
     db.add(new_line)
-    db.commit()
+    await db.commit()
 
     quota_result = QuotaResults(
         id=1,
@@ -145,22 +240,46 @@ def test_get_total_dataused_per_line(db):
         date_time=datetime.now(),
     )
     db.add(quota_result)
-    db.commit()
+    await db.commit()
 
     # Act: Fetch total data used per line
-    get_total_dataused_per_line(db)
+    results = await get_total_dataused_per_line(db)
 
-    # Assert: No assertion needed as we're just testing the display, manual visual verification
+    # Assert: Check the results
+    assert len(results) == 1
+    assert results[0].line_id == 1
+    assert results[0].total_dataused == 100
 
 
-def test_get_count_per_renewal_cost(db):
+@pytest.mark.asyncio
+async def test_line_aggregates_with_null_line(db):
+    """
+    Test that quota results without a line or values are grouped under None.
+    """
+    # Arrange: Add a quota result with every aggregated column NULL
+    db.add(QuotaResults(id=1, date_time=datetime.now()))
+    await db.commit()
+
+    # Act: Fetch the per-line aggregates
+    total_dataused = await get_total_dataused_per_line(db)
+    remaining_balance = await remaining_balance_by_line(db)
+
+    # Assert: A single NULL group is returned instead of failing validation
+    assert [(r.line_id, r.total_dataused) for r in total_dataused] == [(None, None)]
+    assert [(r.line_id, r.total_balance) for r in remaining_balance] == [
+        (None, None)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_get_count_per_renewal_cost(db):
     """
     Test fetching the count of occurrences for each renewal cost.
     """
     # Arrange: Add test data
     new_line = Line(id=1, line_number="123", name="Test Line")
     db.add(new_line)
-    db.commit()
+    await db.commit()
 
     quota_result = QuotaResults(
         id=1,
@@ -176,22 +295,67 @@ def test_get_count_per_renewal_cost(db):
         date_time=datetime.now(),
     )
     db.add(quota_result)
-    db.commit()
+    await db.commit()
+
+    # Act: Fetch the count per renewal cost
+    results = await get_count_per_renewal_cost(db, min_count=1)
+
+    # Assert: Check the results
+    assert len(results) == 1
+    assert results[0].renewal_cost == 20
+    assert results[0].count == 1
+
+
+@pytest.mark.asyncio
+async def test_get_count_per_renewal_cost_other_bucket(db):
+    """
+    Test that infrequent renewal costs are grouped into a single bucket.
+    """
+    # Arrange: Add one frequent and two infrequent renewal costs
+    new_line = Line(id=1, line_number="123", name="Test Line")
+    db.add(new_line)
+    await db.commit()
+
+    for id, renewal_cost in enumerate([20, 20, 20, 30, 40], start=1):
+        db.add(
+            QuotaResults(
+                id=id,
+                process_id=f"proc-{id}",
+                line_id=1,
+                data_used=100,
+                usage_percentage=50,
+                data_remaining=100,
+                balance=50,
+                renewal_date="2023-09-01",
+                remaining_days=10,
+                renewal_cost=renewal_cost,
+                date_time=datetime.now(),
+            )
+        )
+    await db.commit()
 
     # Act: Fetch the count per renewal cost
-    get_count_per_renewal_cost(db)
+    results = await get_count_per_renewal_cost(db, min_count=3)
 
-    # Assert: No assertion needed as we're testing chart generation, manual verification
+    # Assert: Costs below the threshold are reported as one "Other" row
+    assert len(results) == 2
+    assert results[0].renewal_cost == 20
+    assert results[0].label == "20"
+    assert results[0].count == 3
+    assert results[1].renewal_cost is None
+    assert results[1].label == "Other"
+    assert results[1].count == 2
 
 
-def test_remaining_balance_by_line(db):
+@pytest.mark.asyncio
+async def test_remaining_balance_by_line(db):
     """
     Test fetching the remaining balance by line.
     """
     # Arrange: Add test data
     new_line = Line(id=1, line_number="123", name="Test Line")
     db.add(new_line)
-    db.commit()
+    await db.commit()
 
     quota_result = QuotaResults(
         id=1,
@@ -207,22 +371,140 @@ def test_remaining_balance_by_line(db):
         date_time=datetime.now(),
     )
     db.add(quota_result)
-    db.commit()
+    await db.commit()
 
     # Act: Fetch remaining balance
-    remaining_balance_by_line(db)
+    results = await remaining_balance_by_line(db)
+
+    # Assert: Check the results
+    assert len(results) == 1
+    assert results[0].line_id == 1
+    assert results[0].total_balance == 50
+
+
+@pytest.mark.asyncio
+async def test_speed_stats_per_line(db):
+    """
+    Test fetching the average ping, upload and download speeds per line.
+    """
+    # Arrange: Add test data
+    new_line = Line(id=1, line_number="123", name="Test Line")
+    db.add(new_line)
+    await db.commit()
 
-    # Assert: Check logs for results, manual verification
+    recent_date = datetime.now() - timedelta(days=10)
+
+    for id, ping in [(1, 20), (2, 40)]:
+        db.add(
+            SpeedTestResult(
+                id=id,
+                process_id=f"speed-{id}",
+                line_id=1,
+                ping=ping,
+                upload_speed=50,
+                download_speed=100,
+                public_ip="192.168.1.1",
+                date_time=recent_date,
+            )
+        )
+    await db.commit()
+
+    # Act: Fetch speed stats per line
+    results = await speed_stats_per_line(db, days=30)
+
+    # Assert: Check the results
+    assert len(results) == 1
+    assert results[0].avg_ping == 30
+    assert results[0].avg_upload_speed == 50
+    assert results[0].avg_download_speed == 100
 
 
-def test_average_speeds_per_line(db):
+@pytest.mark.asyncio
+async def test_daily_speed_stats_per_line(db):
+    """
+    Test fetching the daily average speeds per line.
+    """
+    # Arrange: Add two speed tests on one day and one on another
+    new_line = Line(id=1, line_number="123", name="Test Line")
+    db.add(new_line)
+    await db.commit()
+
+    first_day = datetime.now().replace(hour=12, minute=0) - timedelta(days=10)
+    for id, date_time, ping in [
+        (1, first_day, 20),
+        (2, first_day + timedelta(hours=1), 40),
+        (3, first_day + timedelta(days=1), 60),
+    ]:
+        db.add(
+            SpeedTestResult(
+                id=id,
+                process_id=f"speed-{id}",
+                line_id=1,
+                ping=ping,
+                upload_speed=50,
+                download_speed=100,
+                public_ip="192.168.1.1",
+                date_time=date_time,
+            )
+        )
+    await db.commit()
+
+    # Act: Fetch daily speed stats per line
+    results = await daily_speed_stats_per_line(db, days=30)
+
+    # Assert: One row per line and day, in day order
+    assert [result.day for result in results] == [
+        first_day.date(),
+        (first_day + timedelta(days=1)).date(),
+    ]
+    assert results[0].avg_ping == 30
+    assert results[1].avg_ping == 60
+
+
+@pytest.mark.asyncio
+async def test_daily_speed_stats_per_line_full_first_day(db):
+    """
+    Test that the first day of the daily window is averaged from midnight.
+    """
+    # Arrange: Add a speed test early on the first day of the window
+    new_line = Line(id=1, line_number="123", name="Test Line")
+    db.add(new_line)
+    await db.commit()
+
+    first_day = (datetime.now() - timedelta(days=30)).replace(hour=0, minute=1)
+    db.add(SpeedTestResult(id=1, line_id=1, ping=20, date_time=first_day))
+    await db.commit()
+
+    # Act: Fetch daily speed stats over the window
+    results = await daily_speed_stats_per_line(db, days=30)
+
+    # Assert: The first day's speed test is included
+    assert [result.day for result in results] == [first_day.date()]
+
+
+def test_speed_stats_window():
+    """
+    Test that the aggregation window is snapped to a bucket boundary.
+    """
+    # Act: Compute the window
+    start_date, end_date = speed_stats_window(30)
+
+    # Assert: The end lies on a bucket boundary and the window spans the days
+    assert end_date.minute % WINDOW_BUCKET_MINUTES == 0
+    assert end_date.second == 0 and end_date.microsecond == 0
+    assert end_date - start_date == timedelta(days=30)
+    assert datetime.now() - end_date < timedelta(minutes=WINDOW_BUCKET_MINUTES)
+
+
+@pytest.mark.asyncio
+async def test_average_speeds_per_line(db):
     """
     Test fetching the average upload and download speeds per line.
     """
     # Arrange: Add test data
     new_line = Line(id=1, line_number="123", name="Test Line")
     db.add(new_line)
-    db.commit()
+    await db.commit()
 
     recent_date = datetime.now() - timedelta(days=10)
 
@@ -237,10 +519,10 @@ def test_average_speeds_per_line(db):
         date_time=recent_date,
     )
     db.add(speed_test)
-    db.commit()
+    await db.commit()
 
     # Act: Fetch average speeds per line
-    results = average_speeds_per_line(db, days=30)
+    results = await average_speeds_per_line(db, days=30)
 
     # Assert: Check the results
     assert len(results) == 1
@@ -248,14 +530,15 @@ def test_average_speeds_per_line(db):
     assert results[0].avg_download_speed == 100
 
 
-def test_average_ping_per_line(db):
+@pytest.mark.asyncio
+async def test_average_ping_per_line(db):
     """
     Test fetching the average ping per line.
     """
     # Arrange: Add test data
     new_line = Line(id=1, line_number="123", name="Test Line")
     db.add(new_line)
-    db.commit()
+    await db.commit()
 
     # Set the date to be within the last 30 days
     recent_date = datetime.now() - timedelta(days=10)
@@ -271,11 +554,143 @@ def test_average_ping_per_line(db):
         date_time=recent_date,  # Use recent date
     )
     db.add(speed_test)
-    db.commit()
+    await db.commit()
 
     # Act: Fetch average ping per line
-    results = average_ping_per_line(db, days=30)
+    results = await average_ping_per_line(db, days=30)
 
     # Assert: Check the results
     assert len(results) == 1
     assert results[0].avg_ping == 20
+
+
+class FakeRedis:
+    """
+    Minimal in-memory stand-in for the async Redis client.
+    """
+
+    def __init__(self):
+        self.store = {}
+
+    async def get(self, key):
+        return self.store.get(key)
+
+    async def mget(self, *keys):
+        return [self.store.get(key) for key in keys]
+
+    async def setex(self, key, ttl, value):
+        # Like Redis, hand values back as bytes
+        self.store[key] = value.encode() if isinstance(value, str) else value
+
+
+@pytest.mark.asyncio
+async def test_cached_aggregate(db, monkeypatch):
+    """
+    Test that aggregation results are served from the cache once stored.
+    """
+    # Arrange: Use a fake Redis client, pin the window, and add test data
+    fake_redis = FakeRedis()
+    monkeypatch.setattr(cache, "redis_client", fake_redis)
+    start_date, end_date = speed_stats_window(30)
+    monkeypatch.setattr(
+        "db.crud.speed_stats_window", lambda days: (start_date, end_date)
+    )
+
+    new_line = Line(id=1, line_number="123", name="Test Line")
+    db.add(new_line)
+    await db.commit()
+
+    speed_test = SpeedTestResult(
+        id=1,
+        process_id="speed-123",
+        line_id=1,
+        ping=20,
+        upload_speed=50,
+        download_speed=100,
+        public_ip="192.168.1.1",
+        date_time=datetime.now() - timedelta(days=10),
+    )
+    db.add(speed_test)
+    await db.commit()
+
+    # Act: Populate the cache, then remove the underlying rows
+    first = await average_speeds_per_line(db, days=30)
+    await db.execute(delete(SpeedTestResult))
+    await db.commit()
+    second = await average_speeds_per_line(db, days=30)
+
+    # Assert: The second call is served from the cache
+    assert f"agg:speed_stats:{start_date}:{end_date}" in fake_redis.store
+    assert second == first
+
+
+def test_render_charts():
+    """
+    Test that the chart renderers produce PNG images.
+    """
+    # Act: Render both charts
+    bar_chart = charts.render_total_dataused_chart([1, 2, None], [100, 200, None])
+    pie_chart = charts.render_renewal_cost_chart(["20.00", "Other"], [3, 2])
+
+    # Assert: Both are PNG images
+    assert bar_chart.startswith(b"\x89PNG")
+    assert pie_chart.startswith(b"\x89PNG")
+
+
+@pytest.mark.asyncio
+async def test_render_in_executor():
+    """
+    Test that charts render in the spawned worker pool.
+    """
+    # Act: Render a chart through the executor the app runs
+    executor = charts.create_executor()
+    try:
+        png = await charts.render(
+            executor, charts.render_renewal_cost_chart, ["20.00"], [1]
+        )
+    finally:
+        executor.shutdown()
+
+    # Assert: The worker returned a PNG image
+    assert png.startswith(b"\x89PNG")
+
+
+@pytest.mark.asyncio
+async def test_chart_store(monkeypatch):
+    """
+    Test storing and loading chart task results without Redis.
+    """
+    # Arrange: Disable Redis so the in-process store is used
+    monkeypatch.setattr(cache, "redis_client", None)
+
+    # Act: Store a pending task, then its rendered chart
+    await charts.save_chart("task-1", charts.PENDING)
+    pending = await charts.load_chart("task-1")
+    await charts.save_chart("task-1", charts.DONE, b"png")
+    done = await charts.load_chart("task-1")
+
+    # Assert: The latest status is returned and unknown tasks are missing
+    assert pending == (charts.PENDING, None)
+    assert done == (charts.DONE, b"png")
+    assert await charts.load_chart("unknown") is None
+
+
+@pytest.mark.asyncio
+async def test_chart_store_redis(monkeypatch):
+    """
+    Test storing and loading chart task results through Redis.
+    """
+    # Arrange: Use an in-memory Redis so nothing falls back to the local store
+    monkeypatch.setattr(cache, "redis_client", FakeRedis())
+
+    # Act: Store a pending task, then its rendered chart
+    await charts.save_chart("task-2", charts.PENDING)
+    pending = await charts.load_chart("task-2")
+    await charts.save_chart("task-2", charts.DONE, b"png")
+    done = await charts.load_chart("task-2")
+
+    # Assert: Status and PNG round-trip as separate values
+    assert pending == (charts.PENDING, None)
+    assert done == (charts.DONE, b"png")
+    assert "task-2" not in charts._charts
+    assert await charts.load_chart("unknown") is None